@@ -82,12 +82,34 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite',  # sqlite3 with BEGIN IMMEDIATE transactions
         'NAME': BASE_DIR / 'db.sqlite3',  # Make sure this path is correct
+        # Close connections at the end of each request so none lingers between
+        # requests holding a read snapshot that blocks WAL checkpoints
+        'CONN_MAX_AGE': 0,
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Set REDIS_URL to share the cache between workers (requires the redis package)
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -130,6 +152,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Spool every upload next to MEDIA_ROOT so it is hashed straight from disk and
+# storage moves it into place with a rename instead of copying every byte again
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'tmp')
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+FILE_UPLOAD_MAX_MEMORY_SIZE = 0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -145,13 +173,11 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
     ],
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_PAGINATION_CLASS': 'files.pagination.FilePagination',
+    'PAGE_SIZE': 50,
 }
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Configure appropriately in production
-CORS_ALLOW_CREDENTIALS = True
-
-
-REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
-}
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
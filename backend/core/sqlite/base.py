@@ -0,0 +1,12 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend whose transactions take the write lock when they open"""
+
+    def _start_transaction_under_autocommit(self):
+        # A deferred BEGIN lets an atomic block read first and upgrade to the write
+        # lock later; if another connection commits in between, that upgrade fails
+        # at once with "database is locked" and busy_timeout can't help. BEGIN
+        # IMMEDIATE queues on busy_timeout up front instead.
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -1,6 +1,16 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FilesConfig(AppConfig):
   default_auto_field = "django.db.models.BigAutoField"
   name = "files"
+
+  def ready(self):
+    from . import signals  # noqa: F401
+
+    # Upload handlers don't create the spool directory themselves
+    if settings.FILE_UPLOAD_TEMP_DIR:
+      os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
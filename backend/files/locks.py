@@ -0,0 +1,25 @@
+import time
+import uuid
+from contextlib import contextmanager
+from django.core.cache import cache
+
+@contextmanager
+def dedup_lock(file_hash, timeout=30, wait=10):
+    """
+    Serialize duplicate detection for one content hash across workers.
+    Uses cache.add, which is an atomic SET NX EX on the Redis cache backend;
+    with the local-memory cache it only covers threads of one process.
+    """
+    key = f'files:dedup:{file_hash}'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(key, token, timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for dedup lock on {file_hash}")
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        # Only release our own lock; it may have expired and been taken by another worker
+        if cache.get(key) == token:
+            cache.delete(key)
@@ -0,0 +1,35 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def rehash_files(apps, schema_editor):
+    """Recompute stored MD5 hashes as BLAKE2b so old uploads keep deduplicating"""
+    File = apps.get_model('files', 'File')
+    for original in File.objects.filter(is_duplicate=False).iterator():
+        try:
+            with original.file.open('rb') as f:
+                hasher = hashlib.blake2b(digest_size=32)
+                for chunk in f.chunks(1024 * 1024):
+                    hasher.update(chunk)
+                file_hash = hasher.hexdigest()
+        except (FileNotFoundError, ValueError):
+            file_hash = None
+        File.objects.filter(pk=original.pk).update(file_hash=file_hash)
+        File.objects.filter(original_file=original).update(file_hash=file_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_file_version_file_files_file_file_ha_868749_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(rehash_files, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='file',
+            name='file_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
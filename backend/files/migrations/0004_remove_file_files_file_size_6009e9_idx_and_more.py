@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_file_hash_blake2b'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_file_size_6009e9_idx',
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['size', 'file_hash'], name='files_file_size_128caf_idx'),
+        ),
+    ]
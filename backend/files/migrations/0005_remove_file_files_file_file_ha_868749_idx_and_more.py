@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:31
+
+from django.db import migrations, models, transaction
+
+
+def merge_duplicate_originals(apps, schema_editor):
+    """
+    Keep the earliest original per hash and turn the others, with their duplicates,
+    into duplicates of it so the unique constraint can be added
+    """
+    File = apps.get_model('files', 'File')
+    clashing = (
+        File.objects.order_by()
+        .filter(is_duplicate=False, file_hash__isnull=False)
+        .values('file_hash')
+        .annotate(n=models.Count('id'))
+        .filter(n__gt=1)
+    )
+    for file_hash in [row['file_hash'] for row in clashing]:
+        kept, *others = File.objects.filter(file_hash=file_hash, is_duplicate=False).order_by('uploaded_at', 'pk')
+        for other in others:
+            kept.reference_count += other.reference_count
+            File.objects.filter(models.Q(pk=other.pk) | models.Q(original_file=other)).update(
+                is_duplicate=True, original_file=kept, file=kept.file.name, reference_count=1
+            )
+            if other.file.name != kept.file.name:
+                # Only remove the redundant copy once the migration has committed
+                transaction.on_commit(
+                    lambda stored=other.file: stored.storage.delete(stored.name),
+                    using=schema_editor.connection.alias,
+                )
+        File.objects.filter(pk=kept.pk).update(reference_count=kept.reference_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_remove_file_files_file_size_6009e9_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_originals, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_file_file_ha_868749_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_duplicate', False)), fields=('file_hash',), name='uniq_original_hash'),
+        ),
+    ]
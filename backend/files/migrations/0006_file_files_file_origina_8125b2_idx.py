@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_remove_file_files_file_file_ha_868749_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['original_filename', 'version'], name='files_file_origina_8125b2_idx'),
+        ),
+    ]
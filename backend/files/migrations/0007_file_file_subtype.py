@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:32
+
+from django.db import migrations, models
+
+
+def populate_file_subtype(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    for file_type in File.objects.values_list('file_type', flat=True).distinct():
+        subtype = file_type.split('/')[-1].strip().lower()
+        File.objects.filter(file_type=file_type).update(file_subtype=subtype)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0006_file_files_file_origina_8125b2_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='file_subtype',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(populate_file_subtype, migrations.RunPython.noop),
+    ]
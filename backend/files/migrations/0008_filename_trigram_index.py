@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:33
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm is PostgreSQL-only; other backends keep the plain LIKE scan
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS files_file_filename_trgm '
+        'ON files_file USING gin (original_filename gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS files_file_filename_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_file_file_subtype'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:35
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_storage_saved(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    File.objects.filter(is_duplicate=False, reference_count__gt=1).update(
+        storage_saved=F('size') * (F('reference_count') - 1)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_filename_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='storage_saved',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(populate_storage_saved, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:38
+
+from django.db import migrations, models
+
+
+def renumber_versions(apps, schema_editor):
+    """Give every upload of a filename a distinct version, oldest first, before enforcing it"""
+    File = apps.get_model('files', 'File')
+    clashing = (
+        File.objects.order_by()
+        .values('original_filename', 'version')
+        .annotate(n=models.Count('id'))
+        .filter(n__gt=1)
+    )
+    for filename in {row['original_filename'] for row in clashing}:
+        rows = File.objects.filter(original_filename=filename).order_by('uploaded_at', 'version')
+        for version, pk in enumerate(rows.values_list('pk', flat=True), start=1):
+            File.objects.filter(pk=pk).update(version=version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_file_storage_saved'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_versions, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_file_origina_8125b2_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(fields=('original_filename', 'version'), name='uniq_filename_version'),
+        ),
+    ]
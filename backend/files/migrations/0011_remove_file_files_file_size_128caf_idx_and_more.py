@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:41
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def populate_head_hash(apps, schema_editor):
+    """Hash the first 64 KB of every stored original and copy it to its duplicates"""
+    File = apps.get_model('files', 'File')
+    for original in File.objects.filter(is_duplicate=False).only('id', 'file').iterator():
+        try:
+            with original.file.open('rb') as f:
+                head_hash = hashlib.blake2b(f.read(64 * 1024), digest_size=16).hexdigest()
+        except (FileNotFoundError, ValueError):
+            continue
+        File.objects.filter(models.Q(pk=original.pk) | models.Q(original_file=original)).update(head_hash=head_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_remove_file_files_file_origina_8125b2_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_file_size_128caf_idx',
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='head_hash',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['size', 'head_hash'], name='files_file_size_fa500b_idx'),
+        ),
+        migrations.RunPython(populate_head_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-15 21:44
+
+from django.db import migrations
+
+
+def fts_available(connection):
+    # The trigram tokenizer needs SQLite 3.34+; PostgreSQL uses the pg_trgm index from 0008
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 34, 0)
+
+
+def create_fts_index(apps, schema_editor):
+    if not fts_available(schema_editor.connection):
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS files_file_fts "
+        "USING fts5(file_id UNINDEXED, original_filename, tokenize='trigram')"
+    )
+    File = apps.get_model('files', 'File')
+    rows = File.objects.values_list('id', 'original_filename')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO files_file_fts (rowid, file_id, original_filename) VALUES (%s, %s, %s)',
+            [(file_id.int >> 65, file_id.hex, filename) for file_id, filename in rows.iterator()]
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    if not fts_available(schema_editor.connection):
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS files_file_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_remove_file_files_file_size_128caf_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
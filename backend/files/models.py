@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F, Max, Q, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
 import uuid
 import os
 import hashlib
@@ -9,26 +12,112 @@ def file_upload_path(instance, filename):
     filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('uploads', filename)
 
+# Size of the read buffer used when hashlib.file_digest is unavailable (Python < 3.11)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def new_file_hasher():
+    """Return a fresh hash object for file content (BLAKE2b, 256-bit digest)"""
+    return hashlib.blake2b(digest_size=32)
+
+def _digest_fileobj(fileobj):
+    """Hash a binary file object from its current position to EOF"""
+    if hasattr(hashlib, 'file_digest'):
+        # file_digest runs the read/update loop in C
+        return hashlib.file_digest(fileobj, new_file_hasher).hexdigest()
+    # Read into one reused buffer rather than allocating a bytes object per chunk
+    hasher = new_file_hasher()
+    buf = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buf)
+    while size := fileobj.readinto(buf):
+        hasher.update(view[:size])
+    return hasher.hexdigest()
+
+# Leading bytes hashed into head_hash, the cheap prefilter checked before a full hash
+HEAD_HASH_SIZE = 64 * 1024
+
+def compute_head_hash(file):
+    """Hash the first HEAD_HASH_SIZE bytes of a file without moving its read position"""
+    if hasattr(file, 'temporary_file_path'):
+        with open(file.temporary_file_path(), 'rb') as f:
+            head = f.read(HEAD_HASH_SIZE)
+    else:
+        position = file.tell()
+        file.seek(0)
+        try:
+            head = file.read(HEAD_HASH_SIZE)
+        finally:
+            file.seek(position)
+    return hashlib.blake2b(head, digest_size=16).hexdigest()
+
+def mime_subtype(content_type):
+    """Normalize a MIME type or bare subtype to its lowercase subtype ('application/PDF' -> 'pdf')"""
+    return content_type.split('/')[-1].strip().lower()
+
 def compute_file_hash(file):
-    """Compute MD5 hash of a file"""
-    md5 = hashlib.md5()
-    for chunk in file.chunks():
-        md5.update(chunk)
-    return md5.hexdigest()
+    """Compute BLAKE2b hash of a file without moving its read position"""
+    if hasattr(file, 'temporary_file_path'):
+        # Upload spooled to disk: hash through a separate handle, storage then
+        # moves the temp file into place without reading it again
+        with open(file.temporary_file_path(), 'rb') as f:
+            return _digest_fileobj(f)
+    fileobj = getattr(file, 'file', file)
+    if hasattr(fileobj, 'getbuffer'):
+        # In-memory upload: hash the buffer in place
+        hasher = new_file_hasher()
+        with fileobj.getbuffer() as buf:
+            hasher.update(buf)
+        return hasher.hexdigest()
+    position = file.tell()
+    file.seek(0)
+    try:
+        return _digest_fileobj(fileobj)
+    finally:
+        file.seek(position)
+
+# SQLite trigram FTS5 index over original_filename, kept in step by signals.py
+FILENAME_FTS_TABLE = 'files_file_fts'
+
+def filename_fts_available(connection):
+    """The trigram tokenizer needs SQLite 3.34+; PostgreSQL uses pg_trgm instead"""
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 34, 0)
+
+def filename_fts_rowid(file_id):
+    """Integer FTS rowid for a file's UUID, so index rows are updated by rowid lookup"""
+    return file_id.int >> 65
+
+def filename_search_condition(search):
+    """
+    Q matching files whose original_filename contains search, ignoring case.
+    Terms of 3+ characters go through the trigram index on SQLite; shorter ones
+    have no trigram to look up and fall back to the LIKE scan.
+    """
+    if len(search) >= 3 and filename_fts_available(connection):
+        phrase = '"' + search.replace('"', '""') + '"'
+        return Q(pk__in=RawSQL(
+            f'SELECT file_id FROM {FILENAME_FTS_TABLE} WHERE original_filename MATCH %s', [phrase]
+        ))
+    return Q(original_filename__icontains=search)
 
 class File(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.FileField(upload_to=file_upload_path)
     original_filename = models.CharField(max_length=255)
     file_type = models.CharField(max_length=100)
+    file_subtype = models.CharField(max_length=64, blank=True, default='', db_index=True)
     size = models.BigIntegerField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     # Fields for deduplication
-    file_hash = models.CharField(max_length=255, blank=True, null=True)
+    file_hash = models.CharField(max_length=64, blank=True, null=True)
+    # Hash of the first HEAD_HASH_SIZE bytes; only uploads matching another file's
+    # (size, head_hash) need their full content hashed
+    head_hash = models.CharField(max_length=32, blank=True, null=True)
     is_duplicate = models.BooleanField(default=False)
     original_file = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='duplicates')
     reference_count = models.IntegerField(default=1)
+    # Bytes saved by this original's duplicates, size * (reference_count - 1);
+    # maintained by adjust_reference_count, always 0 for duplicates
+    storage_saved = models.BigIntegerField(default=0, db_index=True)
     
     # Field for versioning
     version = models.IntegerField(default=1)
@@ -37,18 +126,92 @@ class File(models.Model):
         ordering = ['-uploaded_at']
         indexes = [
             models.Index(fields=['file_type']),
-            models.Index(fields=['size']),
+            models.Index(fields=['size', 'head_hash']),
             models.Index(fields=['uploaded_at']),
-            models.Index(fields=['file_hash']),
             models.Index(fields=['is_duplicate']),
         ]
+        constraints = [
+            # One original per hash; the partial unique index also serves the dedup lookup
+            models.UniqueConstraint(
+                fields=['file_hash'],
+                condition=models.Q(is_duplicate=False),
+                name='uniq_original_hash',
+            ),
+            # Also serves the MAX(version) lookup in next_version
+            models.UniqueConstraint(
+                fields=['original_filename', 'version'],
+                name='uniq_filename_version',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.original_filename} (v{self.version})"
     
-    @property
-    def storage_saved(self):
-        """Calculate storage saved if this is an original file with duplicates"""
-        if not self.is_duplicate and self.reference_count > 1:
-            return self.size * (self.reference_count - 1)
-        return 0
\ No newline at end of file
+    def save(self, *args, **kwargs):
+        # Keep the indexed subtype in step with file_type on every write path
+        self.file_subtype = mime_subtype(self.file_type or '')
+        super().save(*args, **kwargs)
+
+def next_version(filename):
+    """
+    Expression for the next version number of filename, evaluated by the database
+    inside the INSERT so concurrent uploads can't read the same MAX(version)
+    """
+    highest = File.objects.filter(original_filename=filename).order_by().values('original_filename').annotate(
+        m=Max('version')
+    ).values('m')
+    return Coalesce(Subquery(highest), 0) + 1
+
+def store_file_hash(original):
+    """Hash an original that was saved unhashed, reading it back from storage"""
+    try:
+        with original.file.open('rb') as f:
+            file_hash = compute_file_hash(f)
+    except FileNotFoundError:
+        return None
+    while True:
+        try:
+            with transaction.atomic():
+                File.objects.filter(pk=original.pk, file_hash__isnull=True).update(file_hash=file_hash)
+            return file_hash
+        except IntegrityError:
+            # Identical uploads that both arrived before either was hashed; the first
+            # one hashed stays the original (uniq_original_hash), this one joins it
+            if fold_into_original(original, file_hash):
+                return file_hash
+            # That original was deleted since the conflict; claim the hash again
+
+def fold_into_original(original, file_hash):
+    """
+    Turn an unhashed original into a duplicate of the existing original with
+    file_hash. Returns False if no such original exists any more.
+    """
+    with transaction.atomic():
+        existing = File.objects.only('id', 'file').filter(file_hash=file_hash, is_duplicate=False).first()
+        if existing is None:
+            return False
+        adjust_reference_count(existing.pk, 1)
+        storage, name = original.file.storage, original.file.name
+        original.file = existing.file.name
+        original.file_hash = file_hash
+        original.is_duplicate = True
+        original.original_file = existing
+        original.save(update_fields=['file', 'file_hash', 'is_duplicate', 'original_file'])
+        # Its own copy of the content is no longer referenced by any row
+        transaction.on_commit(lambda: storage.delete(name))
+    return True
+
+def adjust_reference_count(original_id, delta):
+    """Change an original's reference_count by delta, keeping storage_saved in step"""
+    # SET expressions all read the pre-update row, so the new count is
+    # reference_count + delta on both sides
+    File.objects.filter(pk=original_id).update(
+        reference_count=F('reference_count') + delta,
+        storage_saved=F('size') * (F('reference_count') + delta - 1),
+    )
+
+def backfill_file_hashes(size, head_hash):
+    """Hash stored originals matching size and head_hash whose hashing was deferred at upload"""
+    pending = File.objects.filter(size=size, head_hash=head_hash, is_duplicate=False, file_hash__isnull=True)
+    for original in pending.iterator(chunk_size=2000):
+        store_file_hash(original)
@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+class FilePagination(CursorPagination):
+    """
+    Bound list responses; clients may ask for larger pages up to max_page_size.
+    Pages are keyed on the indexed uploaded_at, so no COUNT(*) runs per request.
+    """
+    ordering = '-uploaded_at'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
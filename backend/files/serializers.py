@@ -2,7 +2,6 @@ from rest_framework import serializers
 from .models import File
 
 class FileSerializer(serializers.ModelSerializer):
-    storage_saved = serializers.SerializerMethodField()
     duplicate_detected = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
@@ -19,9 +18,6 @@ class FileSerializer(serializers.ModelSerializer):
             'version', 'duplicate_detected'
         ]
     
-    def get_storage_saved(self, obj):
-        return obj.storage_saved
-    
     def get_duplicate_detected(self, obj):
         # This will be set in the view, but we need to include it in the serializer
         # to make it available in the API response
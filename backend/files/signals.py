@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import FILENAME_FTS_TABLE, File, filename_fts_available, filename_fts_rowid
+
+STATS_CACHE_KEY = 'files:stats:v1'
+
+@receiver([post_save, post_delete], sender=File)
+def invalidate_stats_cache(sender, **kwargs):
+    """Drop the cached stats payload whenever a file row changes"""
+    # Delete again after commit: a stats request racing the open transaction
+    # would otherwise re-cache the pre-upload numbers for the whole TTL
+    cache.delete(STATS_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(STATS_CACHE_KEY))
+
+@receiver(post_save, sender=File)
+def index_filename(sender, instance, created, update_fields=None, **kwargs):
+    """Add or refresh the file's row in the filename search index"""
+    if not filename_fts_available(connection):
+        return
+    if update_fields is not None and 'original_filename' not in update_fields:
+        return
+    rowid = filename_fts_rowid(instance.pk)
+    with connection.cursor() as cursor:
+        if not created:
+            cursor.execute(f'DELETE FROM {FILENAME_FTS_TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {FILENAME_FTS_TABLE} (rowid, file_id, original_filename) VALUES (%s, %s, %s)',
+            [rowid, instance.pk.hex, instance.original_filename]
+        )
+
+@receiver(post_delete, sender=File)
+def unindex_filename(sender, instance, **kwargs):
+    """Remove the file's row from the filename search index"""
+    if not filename_fts_available(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FILENAME_FTS_TABLE} WHERE rowid = %s', [filename_fts_rowid(instance.pk)])
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Let SQLite readers run alongside a writer (WAL) and have writers wait for
+    the lock inside SQLite instead of failing with "database is locked".
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.execute('PRAGMA synchronous=NORMAL')
@@ -0,0 +1,26 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, transaction
+from .models import File, store_file_hash
+
+logger = logging.getLogger(__name__)
+
+# In-process pool for hashing off the request thread. Work lost when a worker
+# exits is picked up by backfill_file_hashes on the next matching upload.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='file-hash')
+
+def hash_file(file_id):
+    """Hash a stored original whose hash was deferred at upload"""
+    try:
+        original = File.objects.filter(pk=file_id, is_duplicate=False, file_hash__isnull=True).first()
+        if original:
+            store_file_hash(original)
+    except Exception as e:
+        logger.error("Error hashing file %s in background: %s", file_id, e)
+    finally:
+        # Threads get their own connection; don't leave it open in the pool
+        connection.close()
+
+def enqueue_file_hash(file_id):
+    """Schedule hash_file once the current transaction commits"""
+    transaction.on_commit(lambda: _executor.submit(hash_file, file_id))
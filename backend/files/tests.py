@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .models import File, store_file_hash
+
+
+class FileAPITests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        temp_dir = os.path.join(self.media_root, 'tmp')
+        os.makedirs(temp_dir)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, FILE_UPLOAD_TEMP_DIR=temp_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def upload(self, name, content, content_type='text/plain'):
+        response = self.client.post(
+            '/api/files/',
+            {'file': SimpleUploadedFile(name, content, content_type=content_type)},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        return response.json()
+
+    def stored_path(self, file_id):
+        return File.objects.get(pk=file_id).file.path
+
+    def list_names(self, **params):
+        response = self.client.get('/api/files/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(item['original_filename'] for item in response.json()['results'])
+
+    def test_unique_upload(self):
+        data = self.upload('notes.txt', b'hello world')
+
+        self.assertFalse(data['is_duplicate'])
+        self.assertFalse(data['duplicate_detected'])
+        self.assertEqual(data['size'], 11)
+        self.assertEqual(data['version'], 1)
+        self.assertEqual(data['reference_count'], 1)
+        self.assertTrue(os.path.exists(self.stored_path(data['id'])))
+
+    def test_same_filename_gets_next_version(self):
+        self.upload('notes.txt', b'first')
+        data = self.upload('notes.txt', b'second draft')
+
+        self.assertEqual(data['version'], 2)
+
+    def test_duplicate_upload(self):
+        original = self.upload('a.txt', b'hello world')
+        duplicate = self.upload('b.txt', b'hello world')
+
+        self.assertTrue(duplicate['is_duplicate'])
+        self.assertTrue(duplicate['duplicate_detected'])
+        self.assertEqual(duplicate['original_file'], original['id'])
+        self.assertEqual(duplicate['file_hash'], File.objects.get(pk=original['id']).file_hash)
+        self.assertEqual(self.stored_path(duplicate['id']), self.stored_path(original['id']))
+
+        original_row = File.objects.get(pk=original['id'])
+        self.assertEqual(original_row.reference_count, 2)
+        self.assertEqual(original_row.storage_saved, 11)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'uploads'))), 1)
+
+    def test_same_size_different_content_is_not_a_duplicate(self):
+        self.upload('a.txt', b'hello world')
+        data = self.upload('b.txt', b'hello there')
+
+        self.assertFalse(data['is_duplicate'])
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'uploads'))), 2)
+
+    def test_delete_duplicate(self):
+        original = self.upload('a.txt', b'hello world')
+        duplicate = self.upload('b.txt', b'hello world')
+        path = self.stored_path(original['id'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/files/{duplicate['id']}/")
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        original_row = File.objects.get(pk=original['id'])
+        self.assertEqual(original_row.reference_count, 1)
+        self.assertEqual(original_row.storage_saved, 0)
+        self.assertTrue(os.path.exists(path))
+
+    def test_delete_original(self):
+        original = self.upload('a.txt', b'hello world')
+        self.upload('b.txt', b'hello world')
+        path = self.stored_path(original['id'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/files/{original['id']}/")
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_late_hashed_identical_original_becomes_duplicate(self):
+        # Two identical uploads stored before either was hashed
+        first = self.upload('a.txt', b'same bytes')
+        second = self.upload('b.txt', b'same bytes')
+        File.objects.update(file_hash=None, is_duplicate=False, original_file=None, reference_count=1, storage_saved=0)
+        second_row = File.objects.get(pk=second['id'])
+        second_row.file.save('copy.txt', SimpleUploadedFile('copy.txt', b'same bytes'))
+        copy_path = second_row.file.path
+
+        store_file_hash(File.objects.get(pk=first['id']))
+        with self.captureOnCommitCallbacks(execute=True):
+            store_file_hash(File.objects.get(pk=second['id']))
+
+        first_row = File.objects.get(pk=first['id'])
+        second_row.refresh_from_db()
+        self.assertEqual(first_row.reference_count, 2)
+        self.assertEqual(first_row.storage_saved, 10)
+        self.assertTrue(second_row.is_duplicate)
+        self.assertEqual(second_row.original_file_id, first_row.pk)
+        self.assertEqual(second_row.file.name, first_row.file.name)
+        self.assertFalse(os.path.exists(copy_path))
+
+    def test_search(self):
+        self.upload('Quarterly-Report.pdf', b'pdf bytes', 'application/pdf')
+        self.upload('summary.txt', b'summary')
+
+        self.assertEqual(self.list_names(search='report'), ['Quarterly-Report.pdf'])
+        self.assertEqual(self.list_names(search='ARY.T'), ['summary.txt'])
+        self.assertEqual(self.list_names(search='missing'), [])
+
+    def test_date_range_bounds(self):
+        timestamps = {
+            'before.txt': '2024-03-09 23:59:59',
+            'start.txt': '2024-03-10 00:00:00',
+            'end.txt': '2024-03-11 23:59:59',
+            'after.txt': '2024-03-12 00:00:00',
+        }
+        for name, timestamp in timestamps.items():
+            data = self.upload(name, name.encode())
+            File.objects.filter(pk=data['id']).update(
+                uploaded_at=timezone.make_aware(datetime.fromisoformat(timestamp))
+            )
+
+        self.assertEqual(
+            self.list_names(start_date='2024-03-10', end_date='2024-03-11'),
+            ['end.txt', 'start.txt'],
+        )
+        self.assertEqual(self.list_names(start_date='2024-03-12'), ['after.txt'])
+        self.assertEqual(self.list_names(end_date='2024-03-09'), ['before.txt'])
+        self.assertEqual(len(self.list_names(end_date='9999-12-31')), 4)
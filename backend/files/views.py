@@ -1,95 +1,97 @@
 from django.shortcuts import render
-from django.db.models import Q
-from rest_framework import viewsets, status, filters
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from rest_framework import viewsets, status, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
 from django.utils.dateparse import parse_date
-from .models import File, compute_file_hash
+from .models import File, adjust_reference_count, backfill_file_hashes, compute_file_hash, compute_head_hash, filename_search_condition, mime_subtype, next_version
 from .serializers import FileSerializer
-from django.db import transaction, connection, OperationalError
+from .signals import STATS_CACHE_KEY
+from .tasks import enqueue_file_hash
+from .locks import dedup_lock
+from django.core.cache import cache
+from django.db import transaction
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 import logging
-import time
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Formats timestamps in upload responses exactly as FileSerializer does
+UPLOADED_AT_FIELD = serializers.DateTimeField()
+
+# Seconds a computed stats payload may be served before it is recomputed
+STATS_CACHE_TIMEOUT = 30
+
+def start_of_day(date_obj):
+    """Midnight starting date_obj in the current time zone, as the __date lookup interprets it"""
+    return timezone.make_aware(datetime.combine(date_obj, time.min))
+
+@lru_cache(maxsize=256)
+def file_type_condition(file_types):
+    """
+    Q matching any of file_types on the indexed subtype column, e.g. both
+    'application/pdf' and 'pdf' -> 'pdf'. Cached because paging through a
+    filtered list repeats the same combination on every request.
+    """
+    return Q(file_subtype__in=sorted({mime_subtype(ft) for ft in file_types}))
+
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.all()
     serializer_class = FileSerializer
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
-    search_fields = ['original_filename']
-    filterset_fields = ['file_type', 'is_duplicate']
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['is_duplicate']
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        params = self.request.query_params
+        conditions = []
         
-        show_unique_only = self.request.query_params.get('unique_only')
+        show_unique_only = params.get('unique_only')
         if show_unique_only and show_unique_only.lower() == 'true':
-            queryset = queryset.filter(is_duplicate=False)
-        
-        min_size = self.request.query_params.get('min_size')
-        max_size = self.request.query_params.get('max_size')
+            conditions.append(Q(is_duplicate=False))
         
-        if min_size:
-            try:
-                min_size = int(min_size)
-                queryset = queryset.filter(size__gte=min_size)
-            except ValueError:
-                pass
-                
-        if max_size:
-            try:
-                max_size = int(max_size)
-                queryset = queryset.filter(size__lte=max_size)
-            except ValueError:
-                pass
+        for param, lookup in (('min_size', 'size__gte'), ('max_size', 'size__lte')):
+            value = params.get(param)
+            if value:
+                try:
+                    conditions.append(Q(**{lookup: int(value)}))
+                except ValueError:
+                    pass
         
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
+        # Half-open range on the raw timestamp so the uploaded_at index serves it;
+        # DATE(uploaded_at) comparisons can't use the index
+        start_date = params.get('start_date')
+        date_obj = parse_date(start_date) if start_date else None
+        if date_obj:
+            conditions.append(Q(uploaded_at__gte=start_of_day(date_obj)))
         
-        if start_date:
-            date_obj = parse_date(start_date)
-            if date_obj:
-                queryset = queryset.filter(uploaded_at__date__gte=date_obj)
-                
-        if end_date:
-            date_obj = parse_date(end_date)
-            if date_obj:
-                queryset = queryset.filter(uploaded_at__date__lte=date_obj)
+        end_date = params.get('end_date')
+        date_obj = parse_date(end_date) if end_date else None
+        # The last representable date has no next day; nothing can be later anyway
+        if date_obj and date_obj < date.max:
+            conditions.append(Q(uploaded_at__lt=start_of_day(date_obj + timedelta(days=1))))
         
-        search = self.request.query_params.get('search')
+        search = params.get('search')
         if search:
-            queryset = queryset.filter(original_filename__icontains=search)
+            conditions.append(filename_search_condition(search))
         
         # Collect all file types from both parameter formats
-        file_types = []
-        
-        file_type_list = self.request.query_params.getlist('file_type')
-        if file_type_list:
-            file_types.extend(file_type_list)
-        
-        file_type_array = self.request.query_params.getlist('file_type[]')
-        if file_type_array:
-            file_types.extend(file_type_array)
+        file_types = params.getlist('file_type') + params.getlist('file_type[]')
         
-        # If we have file types, build a proper OR query
         if file_types:
-            file_type_q = Q()
-            for ft in file_types:
-                if '/' in ft:
-                    # For full MIME types like 'application/pdf'
-                    file_type_q |= Q(file_type__icontains=ft)
-                    # Also add the subtype for more flexibility
-                    subtype = ft.split('/')[-1]
-                    file_type_q |= Q(file_type__icontains=subtype)
-                else:
-                    # For partial types like just 'pdf'
-                    file_type_q |= Q(file_type__icontains=ft)
-            
-            queryset = queryset.filter(file_type_q)
+            conditions.append(file_type_condition(tuple(sorted(set(file_types)))))
         
-        return queryset
+        # Apply every filter in one call and fetch only the columns FileSerializer renders
+        return super().get_queryset().filter(*conditions).only(
+            'id', 'file', 'original_filename', 'file_type', 'size', 'uploaded_at',
+            'file_hash', 'is_duplicate', 'original_file', 'reference_count',
+            'storage_saved', 'version'
+        )
     
 
     @action(detail=True, methods=['get'])
@@ -103,33 +105,74 @@ class FileViewSet(viewsets.ModelViewSet):
             
             if original_file.is_duplicate:
                 # If this is a duplicate, redirect to its original
-                if original_file.original_file:
+                if original_file.original_file_id:
                     return Response({
                         'error': 'This is a duplicate file itself',
-                        'original_file_id': original_file.original_file.id
+                        'original_file_id': original_file.original_file_id
                     }, status=status.HTTP_400_BAD_REQUEST)
                 else:
                     return Response({
                         'error': 'This is a duplicate file but has no reference to an original'
                     }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Find all duplicates that reference this original file
-            duplicates = File.objects.filter(original_file=original_file)
+            # Find all duplicates that reference this original file; materialize once
+            # and count the list rather than issuing a separate COUNT query
+            duplicates = list(original_file.duplicates.all())
             serializer = self.get_serializer(duplicates, many=True)
             
             return Response({
                 'original_file': self.get_serializer(original_file).data,
-                'duplicate_count': duplicates.count(),
+                'duplicate_count': len(duplicates),
                 'duplicates': serializer.data
             })
             
         except Exception as e:
-            logger.error(f"Error retrieving file duplicates: {str(e)}")
+            logger.error("Error retrieving file duplicates: %s", e)
             return Response(
                 {'error': f'Error retrieving file duplicates: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _upload_response_data(self, new_file, duplicate_detected):
+        """
+        Build the upload response directly instead of running FileSerializer;
+        every value is already known here. Mirrors FileSerializer's output.
+        """
+        return {
+            'id': str(new_file.id),
+            'file': self.request.build_absolute_uri(new_file.file.url),
+            'original_filename': new_file.original_filename,
+            'file_type': new_file.file_type,
+            'size': new_file.size,
+            'uploaded_at': UPLOADED_AT_FIELD.to_representation(new_file.uploaded_at),
+            'file_hash': new_file.file_hash,
+            'is_duplicate': new_file.is_duplicate,
+            'original_file': str(new_file.original_file_id) if new_file.original_file_id else None,
+            'reference_count': new_file.reference_count,
+            'storage_saved': new_file.storage_saved,
+            'version': new_file.version,
+            'duplicate_detected': duplicate_detected,
+        }
+
+    def perform_destroy(self, instance):
+        """
+        Delete a file record, keeping reference counts and stored bytes consistent.
+        Duplicates share their original's stored file, so the file is only removed
+        from storage when the original itself is deleted.
+        """
+        with transaction.atomic():
+            # Every row sharing a stored file is its original or one of the
+            # original's duplicates, which the delete below cascades to
+            owns_file = not (instance.is_duplicate and instance.original_file_id)
+            if not owns_file:
+                adjust_reference_count(instance.original_file_id, -1)
+            
+            storage, name = instance.file.storage, instance.file.name
+            instance.delete()  # Deleting an original cascades to its duplicates
+            
+            if owns_file and name:
+                transaction.on_commit(lambda: storage.delete(name))
+
     def create(self, request, *args, **kwargs):
         """
         Handle file upload with duplicate detection and prevention of double entries.
@@ -139,298 +182,128 @@ class FileViewSet(viewsets.ModelViewSet):
             if not file_obj:
                 return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Make sure file is at the beginning
-            file_obj.seek(0)
+            # Get content type, with fallback
+            content_type = getattr(file_obj, 'content_type', 'application/octet-stream')
+            
+            # Recorded by the upload handler while the body was streamed in; no re-read
+            file_size = file_obj.size
             
+            # Identical content implies identical size and leading bytes, so only hash
+            # the whole upload when another file matches both. Other uploads are stored
+            # unhashed and hashed by backfill_file_hashes once a match needs to compare.
+            file_hash = None
             try:
-                file_hash = compute_file_hash(file_obj)
-                # Reset file pointer to beginning after hash calculation
-                file_obj.seek(0)
+                head_hash = compute_head_hash(file_obj)
+                if File.objects.filter(size=file_size, head_hash=head_hash).exists():
+                    backfill_file_hashes(file_size, head_hash)
+                    file_hash = compute_file_hash(file_obj)
             except Exception as e:
-                logger.error(f"Error computing file hash: {str(e)}")
+                logger.error("Error computing file hash: %s", e)
                 return Response(
                     {'error': f'Error processing file: {str(e)}'},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
-            # Get content type, with fallback
-            content_type = getattr(file_obj, 'content_type', 'application/octet-stream')
-            
-            # Get file size with error handling
-            try:
-                file_size = file_obj.size
-            except AttributeError:
-                file_size = 0
-                logger.warning("Could not determine file size, defaulting to 0")
+            # Hold a per-hash lock across lookup and insert so concurrent uploads of the
+            # same content can't both become the original
+            lock = dedup_lock(file_hash) if file_hash else nullcontext()
             
-            # Added lock detection for all database operations
-            def execute_with_retry(func, max_retries=3):
-                """Helper to execute functions with retry on database lock"""
-                retry_count = 0
-                while retry_count < max_retries:
-                    try:
-                        return func()
-                    except OperationalError as e:
-                        if "database is locked" in str(e).lower() and retry_count < max_retries - 1:
-                            retry_count += 1
-                            sleep_time = 0.5 * (2 ** retry_count)  # Exponential backoff
-                            logger.warning(f"Database locked, retrying in {sleep_time} seconds (attempt {retry_count+1}/{max_retries})")
-                            time.sleep(sleep_time)
-                        else:
-                            raise
-                raise Exception(f"Failed after {max_retries} attempts")
+            with lock, transaction.atomic():
+                new_file_fields = {
+                    'original_filename': file_obj.name,
+                    'file_type': content_type,
+                    'size': file_size,
+                    'head_hash': head_hash,
+                    'version': next_version(file_obj.name),
+                }
                 
-            # Check for existing file with same hash
-            existing_file = execute_with_retry(
-                lambda: File.objects.filter(file_hash=file_hash, is_duplicate=False).first()
-            )
-            
-            # Get highest version for filename
-            highest_version = execute_with_retry(
-                lambda: File.objects.filter(original_filename=file_obj.name).order_by('-version').values_list('version', flat=True).first() or 0
-            )
-            
-            with transaction.atomic():
-                if existing_file:
-                    # This is a duplicate file
-                    logger.info(f"Duplicate file detected: {file_obj.name} matches hash of existing file {existing_file.id}")
-                    
-                    # Update reference count on original file
-                    existing_file.reference_count = existing_file.reference_count + 1
-                    existing_file.save()
-                    
-                    # Create a new entry that references the original file
-                    new_file = File(
-                        file=existing_file.file,  # Reference to existing file's storage
-                        original_filename=file_obj.name,
-                        file_type=content_type,
-                        size=file_size,
+                if file_hash:
+                    # Look up the original for this hash, or insert this upload as it.
+                    # uniq_original_hash makes a concurrent insert fall back to the lookup.
+                    # A found original is only used for its id and stored file
+                    existing_file, created = File.objects.only('id', 'file').get_or_create(
                         file_hash=file_hash,
-                        is_duplicate=True,  # Mark as duplicate
-                        original_file=existing_file,  # Reference to original
-                        version=highest_version + 1
+                        is_duplicate=False,
+                        defaults={'file': file_obj, 'reference_count': 1, **new_file_fields}
                     )
-                    new_file.save()
                     
-                    serializer = self.get_serializer(new_file)
-                    data = serializer.data
-                    data['duplicate_detected'] = True
+                    if not created:
+                        # This is a duplicate file
+                        logger.info("Duplicate file detected: %s matches hash of existing file %s", file_obj.name, existing_file.id)
+                        
+                        # Increment the reference count in SQL so concurrent duplicates don't lose updates
+                        adjust_reference_count(existing_file.pk, 1)
+                        
+                        # Create a new entry that references the original file
+                        new_file = File(
+                            file=existing_file.file,  # Reference to existing file's storage
+                            file_hash=file_hash,
+                            is_duplicate=True,  # Mark as duplicate
+                            original_file=existing_file,  # Reference to original
+                            **new_file_fields
+                        )
+                        new_file.save()
+                        new_file.refresh_from_db(fields=['version'])
+                        
+                        return Response(self._upload_response_data(new_file, duplicate_detected=True), status=status.HTTP_201_CREATED)
                     
-                    return Response(data, status=status.HTTP_201_CREATED)
+                    new_file = existing_file
                 else:
-                    # This is a new unique file
-                    logger.info(f"New unique file uploaded: {file_obj.name}")
-                    
-                    # Create new file record
+                    # Unhashed unique file; hash it off the request thread so it is
+                    # ready for later uploads
                     new_file = File(
                         file=file_obj,
-                        original_filename=file_obj.name,
-                        file_type=content_type,
-                        size=file_size,
-                        file_hash=file_hash,
-                        is_duplicate=False,  # Not a duplicate
-                        reference_count=1,   # Initial reference count
-                        version=highest_version + 1
+                        is_duplicate=False,
+                        reference_count=1,
+                        **new_file_fields
                     )
                     new_file.save()
-                    
-                    serializer = self.get_serializer(new_file)
-                    return Response(serializer.data, status=status.HTTP_201_CREATED)
+                    enqueue_file_hash(new_file.pk)
+                
+                # The version was assigned by the database during the INSERT
+                new_file.refresh_from_db(fields=['version'])
+                
+                # This is a new unique file
+                logger.info("New unique file uploaded: %s", file_obj.name)
+                
+                return Response(self._upload_response_data(new_file, duplicate_detected=False), status=status.HTTP_201_CREATED)
                     
         except Exception as e:
-            logger.error(f"Unhandled exception in file upload: {str(e)}")
+            logger.error("Unhandled exception in file upload: %s", e)
             return Response(
                 {'error': f'An unexpected error occurred during file upload: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            try:
-                file_obj = request.FILES.get('file')
-                if not file_obj:
-                    return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Make sure file is at the beginning
-                file_obj.seek(0)
-                
-                try:
-                    file_hash = compute_file_hash(file_obj)
-                    # Reset file pointer to beginning after hash calculation
-                    file_obj.seek(0)
-                except Exception as e:
-                    logger.error(f"Error computing file hash: {str(e)}")
-                    return Response(
-                        {'error': f'Error processing file: {str(e)}'},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
-                
-                # Get content type, with fallback
-                content_type = getattr(file_obj, 'content_type', 'application/octet-stream')
-                
-                # Get file size with error handling
-                try:
-                    file_size = file_obj.size
-                except AttributeError:
-                    file_size = 0
-                    logger.warning("Could not determine file size, defaulting to 0")
-                
-                # Check for existing file outside transaction
-                existing_file = None
-                try:
-                    existing_file = File.objects.filter(file_hash=file_hash, is_duplicate=False).first()
-                except OperationalError as e:
-                    if "database is locked" in str(e).lower():
-                        logger.warning("Database locked during duplicate check, retrying with delay")
-                        time.sleep(0.5)  # Wait briefly and retry
-                        existing_file = File.objects.filter(file_hash=file_hash, is_duplicate=False).first()
-                    else:
-                        raise
-                
-                # Get highest version
-                highest_version = 0
-                try:
-                    highest_version = File.objects.filter(
-                        original_filename=file_obj.name
-                    ).order_by('-version').values_list('version', flat=True).first() or 0
-                except OperationalError:
-                    # If we can't get the version, just default to 0
-                    pass
-                
-                # Use smaller transactions
-                if existing_file:
-                    # Handle duplicate file case
-                    try:
-                        with transaction.atomic():
-                            existing_file.reference_count = existing_file.reference_count + 1
-                            existing_file.save()
-                    except OperationalError as e:
-                        if "database is locked" in str(e).lower():
-                            # Retry after short delay
-                            time.sleep(0.5)
-                            with transaction.atomic():
-                                # Refetch to avoid stale data
-                                existing_file = File.objects.get(pk=existing_file.pk)
-                                existing_file.reference_count = existing_file.reference_count + 1
-                                existing_file.save()
-                        else:
-                            raise
-                    
-                    # Create duplicate record in separate transaction
-                    try:
-                        with transaction.atomic():
-                            new_file = File(
-                                file=existing_file.file,
-                                original_filename=file_obj.name,
-                                file_type=content_type,
-                                size=file_size,
-                                file_hash=file_hash,
-                                is_duplicate=True,
-                                original_file=existing_file,
-                                version=highest_version + 1
-                            )
-                            new_file.save()
-                    except OperationalError as e:
-                        if "database is locked" in str(e).lower():
-                            # Retry after short delay
-                            time.sleep(1.0)
-                            with transaction.atomic():
-                                new_file = File(
-                                    file=existing_file.file,
-                                    original_filename=file_obj.name,
-                                    file_type=content_type,
-                                    size=file_size,
-                                    file_hash=file_hash,
-                                    is_duplicate=True,
-                                    original_file=existing_file,
-                                    version=highest_version + 1
-                                )
-                                new_file.save()
-                        else:
-                            logger.error(f"Database error creating duplicate file record: {str(e)}")
-                            return Response(
-                                {'error': f'Database error while saving file: {str(e)}'},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                            )
-                    
-                    serializer = self.get_serializer(new_file)
-                    data = serializer.data
-                    data['duplicate_detected'] = True
-                    
-                    headers = self.get_success_headers(serializer.data)
-                    return Response(data, status=status.HTTP_201_CREATED, headers=headers)
-                else:
-                    # Handle new file case - first time this file is uploaded
-                    # Create new file record in a retrying transaction
-                    max_retries = 3
-                    retry_count = 0
-                    while retry_count < max_retries:
-                        try:
-                            with transaction.atomic():
-                                new_file = File(
-                                    file=file_obj,
-                                    original_filename=file_obj.name,
-                                    file_type=content_type,
-                                    size=file_size,
-                                    file_hash=file_hash,
-                                    is_duplicate=False,
-                                    version=highest_version + 1,
-                                    reference_count=1  # Initialize with reference count of 1
-                                )
-                                new_file.save()
-                                break  # Exit the retry loop on success
-                        except OperationalError as e:
-                            if "database is locked" in str(e).lower() and retry_count < max_retries - 1:
-                                retry_count += 1
-                                sleep_time = 0.5 * (2 ** retry_count)  # Exponential backoff
-                                logger.warning(f"Database locked, retrying in {sleep_time} seconds (attempt {retry_count+1}/{max_retries})")
-                                time.sleep(sleep_time)
-                                continue
-                            else:
-                                logger.error(f"Failed to save file after {max_retries} attempts: {str(e)}")
-                                return Response(
-                                    {'error': f'Database is currently busy. Please try again in a moment.'},
-                                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                                )
-                    
-                    serializer = self.get_serializer(new_file)
-                    headers = self.get_success_headers(serializer.data)
-                    return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-                    
-            except Exception as e:
-                logger.error(f"Unhandled exception in file upload: {str(e)}")
-                return Response(
-                    {'error': f'An unexpected error occurred during file upload: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+
+    def _compute_stats(self):
+        # One aggregate query instead of separate counts plus Python-side sums
+        stats = File.objects.aggregate(
+            total_files=Count('id'),
+            unique_files=Count('id', filter=Q(is_duplicate=False)),
+            duplicate_files=Count('id', filter=Q(is_duplicate=True)),
+            total_storage=Coalesce(Sum('size', filter=Q(is_duplicate=False)), 0),
+            storage_saved=Coalesce(Sum('storage_saved'), 0),
+        )
+        total_storage = stats['total_storage']
+        storage_saved = stats['storage_saved']
+        storage_efficiency = (storage_saved / total_storage * 100) if total_storage > 0 else 0
+        
+        return {
+            'total_files': stats['total_files'],
+            'unique_files': stats['unique_files'],
+            'duplicate_files': stats['duplicate_files'],
+            'total_storage': total_storage,
+            'storage_saved': storage_saved,
+            'storage_efficiency': f"{storage_efficiency:.2f}%"
+        }
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
         try:
-            total_files = File.objects.count()
-            unique_files = File.objects.filter(is_duplicate=False).count()
-            duplicate_files = File.objects.filter(is_duplicate=True).count()
-            
-            # Use safer aggregation method to get total storage
-            files_with_size = File.objects.filter(is_duplicate=False).exclude(size__isnull=True)
-            total_storage = sum(f.size or 0 for f in files_with_size)
-            
-            # Safe calculation of storage saved
-            try:
-                storage_saved = sum(getattr(file, 'storage_saved', 0) for file in File.objects.filter(is_duplicate=False))
-                storage_efficiency = (storage_saved / total_storage * 100) if total_storage > 0 else 0
-            except Exception as e:
-                logger.error(f"Error calculating storage statistics: {str(e)}")
-                storage_saved = 0
-                storage_efficiency = 0
-            
-            return Response({
-                'total_files': total_files,
-                'unique_files': unique_files,
-                'duplicate_files': duplicate_files,
-                'total_storage': total_storage,
-                'storage_saved': storage_saved,
-                'storage_efficiency': f"{storage_efficiency:.2f}%"
-            })
+            # Served from cache; invalidated by the File save/delete signals
+            return Response(cache.get_or_set(STATS_CACHE_KEY, self._compute_stats, STATS_CACHE_TIMEOUT))
         except Exception as e:
-            logger.error(f"Error retrieving file stats: {str(e)}")
+            logger.error("Error retrieving file stats: %s", e)
             return Response(
                 {'error': f'Error retrieving file statistics: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
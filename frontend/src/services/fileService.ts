@@ -5,6 +5,9 @@ const api = axios.create({
   baseURL: API_URL,
 });
 
+// Largest page the backend's FilePagination will serve
+const FILE_LIST_PAGE_SIZE = 500;
+
 export interface FileItem {
   id: string;
   file: string;
@@ -20,6 +23,12 @@ export interface FileItem {
   duplicate_detected?: boolean;
 }
 
+export interface PaginatedResponse<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
 export interface FileStats {
   total_files: number;
   unique_files: number;
@@ -56,7 +65,7 @@ export interface DuplicatesResponse {
 
 export const fileService = {
   getFiles: async (filters: FileFilters): Promise<FileItem[]> => {
-    const params: Record<string, any> = {};
+    const params: Record<string, any> = { page_size: FILE_LIST_PAGE_SIZE };
     if (filters?.searchQuery) {
       params.search = filters.searchQuery;
     }
@@ -78,13 +87,22 @@ export const fileService = {
     if (filters?.unique_only !== undefined) {
       params.unique_only = filters.unique_only;
     }
-    const response = await api.get('/files/', {
+    const response = await api.get<PaginatedResponse<FileItem>>('/files/', {
       params,
       paramsSerializer: {
         indexes: null
       }
     });
-    return response.data;
+    // FileList pages on the client, so collect every page; `next` already
+    // carries the filters and the cursor
+    const files = response.data.results;
+    let next = response.data.next;
+    while (next) {
+      const page = await api.get<PaginatedResponse<FileItem>>(next);
+      files.push(...page.data.results);
+      next = page.data.next;
+    }
+    return files;
   },
   
   getFileDuplicates: async (fileId: string): Promise<DuplicatesResponse> => {